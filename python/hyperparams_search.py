@@ -9,6 +9,7 @@ import models
 import optimize
 import training_helpers
 
+import torch.distributed
 import torch.multiprocessing
 import torch.utils.data
 
@@ -24,21 +25,12 @@ TrainingFoldSettings = collections.namedtuple(
         'base_log_dir',
         'base_preload_dir',
         'num_nets_to_train',
-        'batch_use_prob'
+        'batch_use_prob',
+        'loader_num_workers',
+        'dataset_on_gpu'
     ])
 
-def RunTraining(fold_settings):
-  # Select the least used cuda device.
-  cuda_device_assign_lock.acquire()
-  # ctypes arrays do not support the standard list methods, so make a local
-  # copy for convenience.
-  cuda_device_use_count_copy = [x for x in cuda_device_use_count]
-  cuda_device_count_idx = cuda_device_use_count_copy.index(
-      min(cuda_device_use_count_copy))
-  cuda_device_id = cuda_device_ids[cuda_device_count_idx]
-  cuda_device_use_count[cuda_device_count_idx] += 1
-  cuda_device_assign_lock.release()
-
+def TrainFold(fold_settings, cuda_device_id):
   preload_names = None
   if fold_settings.base_preload_dir is not None:
     full_preload_dir = os.path.join(
@@ -55,13 +47,16 @@ def RunTraining(fold_settings):
           fold_settings.num_nets_to_train,
           fold_settings.epochs,
           cuda_device_id=cuda_device_id,
-          preload_weight_names=preload_names))
+          preload_weight_names=preload_names,
+          loader_num_workers=fold_settings.loader_num_workers,
+          dataset_on_gpu=fold_settings.dataset_on_gpu))
 
   out_dir = os.path.join(
     fold_settings.base_out_dir,
     fold_settings.training_settings_json[training_helpers.SETTINGS_ID])
-  if not os.path.isdir(out_dir):
-    os.mkdir(out_dir)
+  # exist_ok so that concurrently started DDP ranks do not race on the
+  # check-then-create.
+  os.makedirs(out_dir, exist_ok=True)
 
   log_dir = os.path.join(
     fold_settings.base_log_dir,
@@ -79,11 +74,68 @@ def RunTraining(fold_settings):
       log_dir=log_dir)
   print(fold_settings.training_settings_json[training_helpers.SETTINGS_ID])
 
+def RunTraining(fold_settings):
+  # Select the least used cuda device.
+  cuda_device_assign_lock.acquire()
+  # ctypes arrays do not support the standard list methods, so make a local
+  # copy for convenience.
+  cuda_device_use_count_copy = [x for x in cuda_device_use_count]
+  cuda_device_count_idx = cuda_device_use_count_copy.index(
+      min(cuda_device_use_count_copy))
+  cuda_device_id = cuda_device_ids[cuda_device_count_idx]
+  cuda_device_use_count[cuda_device_count_idx] += 1
+  cuda_device_assign_lock.release()
+
+  # Bind the worker's default CUDA device so that allocations that do not
+  # take an explicit device id (compiler workspaces, stream pools etc.) land
+  # on the assigned GPU instead of device 0.
+  torch.cuda.set_device(cuda_device_id)
+
+  TrainFold(fold_settings, cuda_device_id)
+
   # Release CUDA device.
   cuda_device_assign_lock.acquire()
   cuda_device_use_count[cuda_device_count_idx] -= 1
   cuda_device_assign_lock.release()
 
+def RunDistributedTraining(
+    rank,
+    world_size,
+    cuda_device_ids,
+    fold_settings,
+    data_dirs,
+    validation_data_dirs,
+    data_file_suffix):
+  """Per-rank entry point for DistributedDataParallel training of one setting.
+
+  Every rank trains the same nets on its own GPU (rank i gets the i-th entry
+  of cuda_device_ids) and its own shard of the training data, with gradients
+  synchronized by DDP's bucketed AllReduce.
+  """
+  os.environ.setdefault('MASTER_ADDR', 'localhost')
+  os.environ.setdefault('MASTER_PORT', '29500')
+  torch.distributed.init_process_group(
+      'nccl', rank=rank, world_size=world_size)
+  cuda_device_id = cuda_device_ids[rank]
+  torch.cuda.set_device(cuda_device_id)
+
+  # Spawned processes do not inherit the parent globals, so every rank loads
+  # the dataset itself.
+  global train_data
+  global val_data
+  data_element_names = (
+      fold_settings.training_settings_json[training_helpers.INPUT_NAMES] +
+      fold_settings.training_settings_json[training_helpers.LABEL_NAMES])
+  train_data = io_helpers.LoadDatasetNumpyFiles(
+      data_dirs.split(','), data_element_names, data_suffix=data_file_suffix)
+  val_data = io_helpers.LoadDatasetNumpyFiles(
+      validation_data_dirs.split(','),
+      data_element_names,
+      data_suffix=data_file_suffix)
+
+  TrainFold(fold_settings, cuda_device_id)
+  torch.distributed.destroy_process_group()
+
 def setup(ids, use_count, cuda_lock):
     global cuda_device_ids
     global cuda_device_use_count
@@ -103,9 +155,17 @@ if __name__ == '__main__':
   parser.add_argument('--out_dir', required=True)
   parser.add_argument('--log_dir', required=True)
   parser.add_argument('--parallelism', type=int, default=1)
+  parser.add_argument('--ddp_world_size', type=int, default=0,
+      help='When > 1, trains every setting with DistributedDataParallel '
+          'across this many GPUs (one rank per GPU, settings trained '
+          'sequentially) instead of fanning independent settings out to a '
+          'process pool.')
   parser.add_argument('--num_nets_to_train', type=int, default=1,
       help='How many identically structured models to train simultaneously.')
   parser.add_argument('--batch_use_prob', type=float, default=1.0)
+  parser.add_argument('--dataset_on_gpu', type=int, default=0,
+      help='Pass 1 to upload the whole (unaugmented) dataset to GPU memory '
+          'once instead of copying batches from the host every epoch.')
   parser.add_argument('--cuda_device_ids', default='0')
  
   args = parser.parse_args()
@@ -121,6 +181,11 @@ if __name__ == '__main__':
       'i', len(cuda_device_ids))
   cuda_device_assign_lock = torch.multiprocessing.Lock()
 
+  # Split the data loading worker budget between the concurrently trained
+  # folds so they do not oversubscribe the CPUs.
+  loader_num_workers = max(
+      1, min(8, (os.cpu_count() or 1) // max(args.parallelism, 1)))
+
   per_fold_settings = [
     TrainingFoldSettings(
         training_settings_json=train_settings,
@@ -129,25 +194,45 @@ if __name__ == '__main__':
         base_log_dir=args.log_dir,
         base_preload_dir=args.preload_dir,
         num_nets_to_train=args.num_nets_to_train,
-        batch_use_prob=args.batch_use_prob)
+        batch_use_prob=args.batch_use_prob,
+        loader_num_workers=loader_num_workers,
+        dataset_on_gpu=bool(args.dataset_on_gpu))
     for train_settings in train_settings_jsons]
 
-  # TODO check that all this matches across settings.
-  first_settings_json = per_fold_settings[0].training_settings_json
-  data_element_names = (
-      first_settings_json[training_helpers.INPUT_NAMES] + 
-      first_settings_json[training_helpers.LABEL_NAMES])
-  train_data = io_helpers.LoadDatasetNumpyFiles(
-      args.data_dirs.split(','),
-      data_element_names,
-      data_suffix=args.data_file_suffix)
-  val_data = io_helpers.LoadDatasetNumpyFiles(
-      args.validation_data_dirs.split(','),
-      data_element_names,
-      data_suffix=args.data_file_suffix)
-
-  with torch.multiprocessing.Pool(
-      args.parallelism,
-      setup,
-      [cuda_device_ids, cuda_device_use_count, cuda_device_assign_lock]) as p:
-    p.map(RunTraining, per_fold_settings)
+  if args.ddp_world_size > 1:
+    # DDP mode: one setting at a time, every setting spread over
+    # ddp_world_size GPUs taken in order from --cuda_device_ids. The ranks
+    # load the data themselves.
+    ddp_device_ids = [int(i) for i in args.cuda_device_ids.split(',')]
+    assert len(ddp_device_ids) >= args.ddp_world_size
+    for fold_settings in per_fold_settings:
+      torch.multiprocessing.spawn(
+          RunDistributedTraining,
+          args=(
+              args.ddp_world_size,
+              ddp_device_ids,
+              fold_settings,
+              args.data_dirs,
+              args.validation_data_dirs,
+              args.data_file_suffix),
+          nprocs=args.ddp_world_size)
+  else:
+    # TODO check that all this matches across settings.
+    first_settings_json = per_fold_settings[0].training_settings_json
+    data_element_names = (
+        first_settings_json[training_helpers.INPUT_NAMES] +
+        first_settings_json[training_helpers.LABEL_NAMES])
+    train_data = io_helpers.LoadDatasetNumpyFiles(
+        args.data_dirs.split(','),
+        data_element_names,
+        data_suffix=args.data_file_suffix)
+    val_data = io_helpers.LoadDatasetNumpyFiles(
+        args.validation_data_dirs.split(','),
+        data_element_names,
+        data_suffix=args.data_file_suffix)
+
+    with torch.multiprocessing.Pool(
+        args.parallelism,
+        setup,
+        [cuda_device_ids, cuda_device_use_count, cuda_device_assign_lock]) as p:
+      p.map(RunTraining, per_fold_settings)
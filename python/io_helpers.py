@@ -110,6 +110,53 @@ class L1LabelWeightingDataset(torch.utils.data.Dataset):
     weight = (self.label_scale * np.mean(np.abs(label), keepdims=True) + 1.0)
     return item[:-1] + (weight,)
 
+class GpuBatchLoader(object):
+  """Serves batches from a dataset uploaded wholesale to a CUDA device.
+
+  The dataset is materialized once through a regular DataLoader pass and the
+  stacked element tensors are uploaded to the GPU, after which every epoch is
+  just on-device index shuffling - no per-epoch host-to-device traffic. Only
+  suitable for datasets that fit in GPU memory and have no per-item
+  augmentation, since the items are frozen at upload time.
+  """
+
+  def __init__(
+      self, dataset, batch_size, shuffle, cuda_device_id, drop_last=False):
+    self.batch_size = batch_size
+    self.shuffle = shuffle
+    self.drop_last = drop_last
+    self.cuda_device = torch.device('cuda', cuda_device_id)
+    materialize_loader = torch.utils.data.DataLoader(
+        dataset, batch_size=batch_size)
+    element_batches = None
+    for batch in materialize_loader:
+      if element_batches is None:
+        element_batches = [[] for _ in batch]
+      for element_idx, element in enumerate(batch):
+        element_batches[element_idx].append(element)
+    assert element_batches is not None  # Empty dataset.
+    self.data = [
+        torch.cat(batches).to(self.cuda_device) for batches in element_batches]
+    self.num_examples = self.data[0].shape[0]
+
+  def __len__(self):
+    if self.drop_last:
+      return self.num_examples // self.batch_size
+    return (self.num_examples + self.batch_size - 1) // self.batch_size
+
+  def __iter__(self):
+    order = None
+    if self.shuffle:
+      order = torch.randperm(self.num_examples, device=self.cuda_device)
+    for batch_idx in range(len(self)):
+      start = batch_idx * self.batch_size
+      end = min(start + self.batch_size, self.num_examples)
+      if order is None:
+        yield tuple(x[start:end] for x in self.data)
+      else:
+        batch_order = order[start:end]
+        yield tuple(x[batch_order] for x in self.data)
+
 class ImageFrameDataset(torch.utils.data.Dataset):
   """Dataset for data files with images (byte per channel).
 
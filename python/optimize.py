@@ -1,21 +1,24 @@
 import io_helpers
 
-import random
+import contextlib
 import time
 from collections import namedtuple
 
+import numpy as np
 import tensorboard_logger
 import torch
+import torch.distributed
 import torch.nn
 
-from torch.autograd import Variable
-
 TRAIN_LOSS = 'train_loss'
 VAL_LOSS = 'val_loss'
 EPOCH_DURATION_SEC = 'epoch_duration_sec'
 EXAMPLES_PER_SEC = 'examples_per_sec'
 
-TrainSettings = namedtuple('TrainSettings', ['loss', 'epochs'])
+TrainSettings = namedtuple(
+    'TrainSettings',
+    ['loss', 'epochs', 'autocast_bf16', 'accumulation_steps'],
+    defaults=(True, 1))
 Learner = namedtuple('Learner', ['net', 'optimizer', 'lr_scheduler'])
 
 class SingleLabelLoss(torch.nn.Module):
@@ -24,11 +27,11 @@ class SingleLabelLoss(torch.nn.Module):
   def __init__(self, base_loss):
     super(SingleLabelLoss, self).__init__()
     self.base_loss = base_loss
-  
+
   def forward(self, predicted, labels, weights):
     assert len(predicted) == 1
     assert len(labels) == 1
-    return self.base_loss.forward(predicted[0], labels[0], weights)  
+    return self.base_loss.forward(predicted[0], labels[0], weights)
 
 class UnweightedLoss(torch.nn.Module):
   """Wraps loss functions that do not support examples weights for TrainModel().
@@ -37,19 +40,26 @@ class UnweightedLoss(torch.nn.Module):
   def __init__(self, base_loss):
     super(UnweightedLoss, self).__init__()
     self.base_loss = base_loss
-  
+
   def forward(self, predicted, labels, weights):
     return self.base_loss.forward(predicted, labels)
 
+@torch.jit.script
+def WeightedMSE(predicted, labels, weights):
+  # type: (torch.Tensor, torch.Tensor, torch.Tensor) -> torch.Tensor
+  # Single fused expression: broadcasting handles the weights without an
+  # explicit expand, and diff * diff avoids a pow() kernel.
+  diff = predicted - labels
+  return (diff * diff * weights).mean()
+
 class WeightedMSELoss(torch.nn.Module):
   """MSE loss with per-example weights."""
 
   def __init__(self):
     super(WeightedMSELoss, self).__init__()
-  
+
   def forward(self, predicted, labels, weights):
-    diff_squares = torch.pow(torch.add(predicted, torch.neg(labels)), 2.0)
-    return torch.mean(torch.mul(diff_squares, weights.expand_as(labels)))
+    return WeightedMSE(predicted, labels, weights)
 
 def TrainLogEventToString(event):
   return 'loss %g;  val loss: %g;  %0.2f sec/epoch; %0.2f examples/sec' % (
@@ -58,19 +68,392 @@ def TrainLogEventToString(event):
       event[EPOCH_DURATION_SEC],
       event[EXAMPLES_PER_SEC])
 
+def UnwrapNet(net):
+  """Returns the plain module under DDP and torch.compile wrappers."""
+  while True:
+    if isinstance(net, torch.nn.parallel.DistributedDataParallel):
+      net = net.module
+    elif hasattr(net, '_orig_mod'):
+      net = net._orig_mod
+    else:
+      return net
+
+def HasBatchNorm(net):
+  """True if the net contains any BatchNorm modules."""
+  return any(
+      isinstance(module, (
+          torch.nn.BatchNorm1d, torch.nn.BatchNorm2d, torch.nn.BatchNorm3d))
+      for module in net.modules())
+
+def IsChiefWorker():
+  """True when not under DDP, or on rank 0, which owns logging and file I/O."""
+  return (not torch.distributed.is_available() or
+      not torch.distributed.is_initialized() or
+      torch.distributed.get_rank() == 0)
+
+def ReduceEpochStats(total_losses, total_examples, cuda_device):
+  """Reads per-net loss sums back to the host as Python lists.
+
+  Under DDP, also sums the losses and example counts across all ranks with a
+  single AllReduce so that every rank sees globally consistent epoch metrics.
+  """
+  if torch.distributed.is_available() and torch.distributed.is_initialized():
+    stats = torch.cat([total_losses, total_examples.to(cuda_device)])
+    torch.distributed.all_reduce(stats)
+    stats = stats.tolist()
+    num_nets = total_losses.shape[0]
+    return stats[:num_nets], stats[num_nets:]
+  return total_losses.tolist(), total_examples.tolist()
+
 def AverageLosses(total_losses, total_examples):
-  return [
-      x / y if y > 0 else float('inf')
-      for x, y in zip(total_losses, total_examples)]
+  losses = np.asarray(total_losses, dtype=np.float64)
+  examples = np.asarray(total_examples, dtype=np.float64)
+  averages = np.full_like(losses, np.inf)
+  np.divide(losses, examples, out=averages, where=(examples > 0))
+  return averages.tolist()
+
+class LearnerList(object):
+  """Trains a list of independent Learners with a per-net Python loop.
+
+  This is the general-purpose implementation: it supports heterogeneous
+  learner state (e.g. DistributedDataParallel-wrapped nets) at the cost of
+  launching a separate forward/backward/step per net per batch.
+  """
+
+  def __init__(self, learners, cuda_device_id):
+    assert len(learners) > 0
+    self.learners = learners
+    # Flat net/optimizer lists save a namedtuple attribute lookup per net in
+    # the per-batch loops.
+    self.nets = [learner.net for learner in learners]
+    self.optimizers = [learner.optimizer for learner in learners]
+    self.cuda_device = torch.device('cuda', cuda_device_id)
+
+  def NumNets(self):
+    return len(self.learners)
+
+  def InputNames(self):
+    return UnwrapNet(self.learners[0].net).InputNames()
+
+  def LabelNames(self):
+    return UnwrapNet(self.learners[0].net).LabelNames()
+
+  def ZeroGrad(self):
+    for optimizer in self.optimizers:
+      optimizer.zero_grad(set_to_none=True)
+
+  def TrainStep(
+      self, loss_fn, input_vars, label_vars, weights_var, use_mask,
+      autocast_bf16=True, accumulation_steps=1, do_step=True):
+    """Runs forward/backward (and optionally a step) for every net.
+
+    use_mask is a pre-sampled [num_nets] host tensor selecting the nets that
+    train on this batch. With accumulation_steps > 1, gradients build up
+    across batches (losses scaled by 1/accumulation_steps) and the
+    optimizers only advance when do_step is set. Returns a [num_nets] GPU
+    tensor of detached per-net losses (zero for the nets that skipped the
+    batch) and use_mask itself.
+    """
+    batch_losses = []
+    for net_idx, (net, optimizer) in enumerate(
+        zip(self.nets, self.optimizers)):
+      if use_mask[net_idx] > 0:
+        sync_context = contextlib.nullcontext()
+        if not do_step and isinstance(
+            net, torch.nn.parallel.DistributedDataParallel):
+          # Skip the gradient AllReduce on non-stepping micro-batches; the
+          # buckets are reduced once on the stepping batch.
+          sync_context = net.no_sync()
+        with sync_context:
+          with torch.autocast(
+              device_type='cuda', dtype=torch.bfloat16,
+              enabled=autocast_bf16):
+            outputs = net(input_vars)
+            loss_value = loss_fn(outputs, label_vars, weights_var)
+          if accumulation_steps > 1:
+            (loss_value / accumulation_steps).backward()
+          else:
+            loss_value.backward()
+        batch_losses.append(loss_value.detach())
+      else:
+        batch_losses.append(torch.zeros((), device=self.cuda_device))
+      if do_step:
+        optimizer.step()
+        optimizer.zero_grad(set_to_none=True)
+    return torch.stack(batch_losses), use_mask
+
+  def EvalLosses(
+      self, loss_fn, input_vars, label_vars, weights_var, autocast_bf16=True):
+    """Returns a [num_nets] GPU tensor of detached per-net losses."""
+    batch_losses = []
+    with torch.autocast(
+        device_type='cuda', dtype=torch.bfloat16, enabled=autocast_bf16):
+      for net in self.nets:
+        outputs = net(input_vars)
+        loss_value = loss_fn(outputs, label_vars, weights_var)
+        batch_losses.append(loss_value.detach())
+    return torch.stack(batch_losses)
+
+  def SetTrain(self):
+    for net in self.nets:
+      net.train()
+
+  def SetEval(self):
+    for net in self.nets:
+      net.eval()
+
+  def SchedulerStep(self, validation_avg_losses):
+    for net_idx, learner in enumerate(self.learners):
+      if learner.lr_scheduler is not None:
+        learner.lr_scheduler.step(validation_avg_losses[net_idx])
+
+  def SaveNet(self, net_idx, file_name):
+    # Copy the state to host-side buffers instead of moving the whole net to
+    # the CPU and back, which would drag every parameter over PCIe twice and
+    # invalidate optimizer/compiled-graph references to the GPU tensors.
+    net = UnwrapNet(self.learners[net_idx].net)
+    state_dict_cpu = {
+        name: value.detach().to('cpu', non_blocking=True)
+        for name, value in net.state_dict().items()}
+    torch.cuda.synchronize(self.cuda_device)
+    torch.save(state_dict_cpu, file_name)
+
+class FusedLearners(object):
+  """Trains several identically structured nets as one vmapped forward pass.
+
+  The per-net parameters and buffers are stacked along a leading 'net'
+  dimension and all nets are evaluated through a single torch.vmap-ed
+  functional call, so every batch costs one set of kernel launches instead
+  of one per net. A single optimizer updates the stacked parameters; the
+  per-net losses are kept separate so the nets stay statistically
+  independent.
+
+  Nets with BatchNorm are not supported: vmap cannot update the running
+  statistics in place, and patching the modules out would write checkpoints
+  without running_mean/running_var that strict load_state_dict rejects at
+  inference and preload time. Callers route such nets to LearnerList.
+  """
+
+  def __init__(
+      self, nets, optimizer_factory, lr_scheduler_factory, cuda_device_id):
+    assert len(nets) > 0
+    self.cuda_device = torch.device('cuda', cuda_device_id)
+    for net in nets:
+      assert not HasBatchNorm(net)
+    # The first net doubles as the stateless template for functional calls.
+    self.template_net = nets[0]
+    self.num_nets = len(nets)
+    params, buffers = torch.func.stack_module_state(nets)
+    self.params = {
+        name: stacked.detach().requires_grad_()
+        for name, stacked in params.items()}
+    self.buffers = {
+        name: stacked.detach() for name, stacked in buffers.items()}
+    self.optimizer = optimizer_factory(list(self.params.values()))
+    self.lr_scheduler = lr_scheduler_factory(self.optimizer)
+
+    def StackedForward(params, buffers, input_vars):
+      return torch.func.functional_call(
+          self.template_net, (params, buffers), (input_vars,))
+    # randomness='different' gives each replica independent dropout masks;
+    # the default ('error') would raise on any net with dropout_prob > 0.
+    self.vmapped_forward = torch.vmap(
+        StackedForward, in_dims=(0, 0, None), randomness='different')
+    if hasattr(torch, 'compile'):
+      # Steps are shape-stable (the train loader drops the last partial
+      # batch), so reduce-overhead mode can capture the step as a CUDA graph
+      # and replay it instead of re-launching every kernel.
+      self.vmapped_forward = torch.compile(
+          self.vmapped_forward, mode='reduce-overhead')
+
+  def NumNets(self):
+    return self.num_nets
+
+  def InputNames(self):
+    return self.template_net.InputNames()
+
+  def LabelNames(self):
+    return self.template_net.LabelNames()
+
+  def ZeroGrad(self):
+    self.optimizer.zero_grad(set_to_none=True)
+
+  def PerNetLosses(
+      self, loss_fn, input_vars, label_vars, weights_var, autocast_bf16=True):
+    with torch.autocast(
+        device_type='cuda', dtype=torch.bfloat16, enabled=autocast_bf16):
+      outputs = self.vmapped_forward(self.params, self.buffers, input_vars)
+      def PerNetLoss(per_net_outputs):
+        return loss_fn(per_net_outputs, label_vars, weights_var)
+      return torch.vmap(PerNetLoss)(outputs)
+
+  def TrainStep(
+      self, loss_fn, input_vars, label_vars, weights_var, use_mask,
+      autocast_bf16=True, accumulation_steps=1, do_step=True):
+    """Runs one fused forward/backward (and optionally a step) over all nets.
+
+    The pre-sampled use_mask is multiplied into the loss vector, so skipped
+    nets get zero gradients without a Python branch or a divergent graph.
+    With accumulation_steps > 1, gradients build up across batches and the
+    optimizer only advances when do_step is set.
+    """
+    per_net_losses = self.PerNetLosses(
+        loss_fn, input_vars, label_vars, weights_var, autocast_bf16)
+    use_mask_gpu = use_mask.to(self.cuda_device, non_blocking=True)
+    total_loss = (per_net_losses * use_mask_gpu).sum()
+    if accumulation_steps > 1:
+      total_loss = total_loss / accumulation_steps
+    total_loss.backward()
+    if do_step:
+      self.optimizer.step()
+      self.optimizer.zero_grad(set_to_none=True)
+    return per_net_losses.detach() * use_mask_gpu, use_mask
+
+  def EvalLosses(
+      self, loss_fn, input_vars, label_vars, weights_var, autocast_bf16=True):
+    with torch.no_grad():
+      return self.PerNetLosses(
+          loss_fn, input_vars, label_vars, weights_var, autocast_bf16)
+
+  def SetTrain(self):
+    self.template_net.train()
+
+  def SetEval(self):
+    self.template_net.eval()
+
+  def SchedulerStep(self, validation_avg_losses):
+    # The stacked parameters share one optimizer, so there is a single
+    # learning rate schedule driven by the mean validation loss.
+    if self.lr_scheduler is not None:
+      self.lr_scheduler.step(
+          sum(validation_avg_losses) / len(validation_avg_losses))
+
+  def SaveNet(self, net_idx, file_name):
+    state_dict = {}
+    for name, stacked in self.params.items():
+      state_dict[name] = stacked[net_idx].detach().to(
+          'cpu', non_blocking=True)
+    for name, stacked in self.buffers.items():
+      state_dict[name] = stacked[net_idx].detach().to(
+          'cpu', non_blocking=True)
+    torch.cuda.synchronize(self.cuda_device)
+    torch.save(state_dict, file_name)
 
 def DataBatchToVariables(batch, num_inputs, num_labels, cuda_device_id):
   assert len(batch) == num_inputs + num_labels + 1
-  input_vars = [Variable(x).cuda(cuda_device_id) for x in batch[:num_inputs]]
-  label_vars = [Variable(x).cuda(cuda_device_id)
+  input_vars = [
+      x.cuda(cuda_device_id, non_blocking=True) for x in batch[:num_inputs]]
+  label_vars = [
+      x.cuda(cuda_device_id, non_blocking=True)
       for x in batch[num_inputs:(num_inputs + num_labels)]]
-  weights_var = Variable(batch[-1]).cuda(cuda_device_id)
+  weights_var = batch[-1].cuda(cuda_device_id, non_blocking=True)
   return input_vars, label_vars, weights_var
 
+class CUDAPrefetcher(object):
+  """Iterates over a DataLoader, uploading batches on a side CUDA stream.
+
+  The next batch is copied to the GPU while the current one is being consumed
+  by compute, hiding the host-to-device transfer behind the forward/backward
+  passes. The wrapped loader must use pin_memory=True for the copies to be
+  truly asynchronous.
+
+  Device memory is allocated only for the first two batches; afterwards the
+  two buffer sets alternate between the batch being consumed and the one
+  being uploaded, so steady-state iteration does not touch the caching
+  allocator at all (a prerequisite for CUDA graph replay).
+  """
+
+  def __init__(self, loader, num_inputs, num_labels, cuda_device_id):
+    self.loader = loader
+    self.num_inputs = num_inputs
+    self.num_labels = num_labels
+    self.cuda_device_id = cuda_device_id
+    self.stream = torch.cuda.Stream(cuda_device_id)
+    self.buffers = [None, None]
+    self.buffer_slot = 0
+
+  def __iter__(self):
+    self.loader_iter = iter(self.loader)
+    self.next_batch = None
+    self.Preload()
+    return self
+
+  def __next__(self):
+    if self.next_batch is None:
+      raise StopIteration
+    current_stream = torch.cuda.current_stream(self.cuda_device_id)
+    current_stream.wait_stream(self.stream)
+    input_vars, label_vars, weights_var = self.next_batch
+    # The batch tensors were allocated on the side stream; tell the caching
+    # allocator they are now in use on the compute stream so their memory is
+    # not reused too early.
+    for tensor in input_vars + label_vars + [weights_var]:
+      tensor.record_stream(current_stream)
+    self.Preload()
+    return input_vars, label_vars, weights_var
+
+  def Preload(self):
+    try:
+      batch = next(self.loader_iter)
+    except StopIteration:
+      self.next_batch = None
+      return
+    self.buffer_slot = 1 - self.buffer_slot
+    # All compute queued so far on the main stream (in particular everything
+    # consuming this slot's previous batch) must finish before the buffers
+    # are overwritten.
+    self.stream.wait_stream(torch.cuda.current_stream(self.cuda_device_id))
+    with torch.cuda.stream(self.stream):
+      if self.buffers[self.buffer_slot] is None:
+        self.next_batch = DataBatchToVariables(
+            batch, self.num_inputs, self.num_labels, self.cuda_device_id)
+        self.buffers[self.buffer_slot] = self.next_batch
+      else:
+        input_buffers, label_buffers, weights_buffer = (
+            self.buffers[self.buffer_slot])
+        self.next_batch = (
+            [self.CopyToBuffer(dst, src) for dst, src in
+                zip(input_buffers, batch[:self.num_inputs])],
+            [self.CopyToBuffer(dst, src) for dst, src in
+                zip(label_buffers,
+                    batch[self.num_inputs:(self.num_inputs + self.num_labels)])],
+            self.CopyToBuffer(weights_buffer, batch[-1]))
+
+  def CopyToBuffer(self, buffer, batch_tensor):
+    # The final (non-dropped) batch of an epoch may be smaller than the
+    # buffer; hand out a view covering just the batch.
+    target = buffer[:batch_tensor.shape[0]]
+    target.copy_(batch_tensor, non_blocking=True)
+    return target
+
+class DeviceBatchIterator(object):
+  """Splits batches already on the GPU into (inputs, labels, weights)."""
+
+  def __init__(self, loader, num_inputs, num_labels):
+    self.loader = loader
+    self.num_inputs = num_inputs
+    self.num_labels = num_labels
+
+  def __iter__(self):
+    for batch in self.loader:
+      yield (
+          list(batch[:self.num_inputs]),
+          list(batch[self.num_inputs:(self.num_inputs + self.num_labels)]),
+          batch[-1])
+
+def MakeBatchIterator(loader, num_inputs, num_labels, cuda_device_id):
+  """Wraps a loader into an iterator of on-GPU (inputs, labels, weights).
+
+  Loaders that already serve device-resident tensors (GpuBatchLoader) are
+  only split into the element groups: there is no host-to-device copy to
+  hide, and routing their batches through CUDAPrefetcher would add a
+  device-to-device copy per batch and, worse, copy_() later batches into
+  the dataset storage that the loader's slice views alias.
+  """
+  if isinstance(loader, io_helpers.GpuBatchLoader):
+    return DeviceBatchIterator(loader, num_inputs, num_labels)
+  return CUDAPrefetcher(loader, num_inputs, num_labels, cuda_device_id)
+
 def TrainModels(
     learners,
     train_loader,
@@ -81,39 +464,82 @@ def TrainModels(
     batch_use_prob=1.0,
     print_log=True,
     log_dir=''):
+  # Epoch metrics are identical on all ranks after ReduceEpochStats, so only
+  # the chief writes logs and checkpoints; the other ranks would just
+  # duplicate the I/O.
+  is_chief = IsChiefWorker()
   logger = None
-  if log_dir != '':
+  if log_dir != '' and is_chief:
     logger = tensorboard_logger.Logger(log_dir, flush_secs=5)
 
   train_log = []
-  min_validation_losses = [float('inf') for _ in learners]
+  num_nets = learners.NumNets()
+  min_validation_losses = [float('inf') for _ in range(num_nets)]
   min_validation_loss = float('inf')
-  num_inputs = len(learners[0].net.InputNames())
-  num_labels = len(learners[0].net.LabelNames())
+  num_inputs = len(learners.InputNames())
+  num_labels = len(learners.LabelNames())
+  cuda_device = torch.device('cuda', cuda_device_id)
+  train_prefetcher = MakeBatchIterator(
+      train_loader, num_inputs, num_labels, cuda_device_id)
+  val_prefetcher = MakeBatchIterator(
+      val_loader, num_inputs, num_labels, cuda_device_id)
+  # Hoist the per-step invariants out of the hot loops.
+  loss_fn = train_settings.loss
+  autocast_bf16 = train_settings.autocast_bf16
+  accumulation_steps = train_settings.accumulation_steps
+  train_sampler = getattr(train_loader, 'sampler', None)
+  if not isinstance(
+      train_sampler, torch.utils.data.distributed.DistributedSampler):
+    train_sampler = None
   for epoch in range(train_settings.epochs):
-    running_losses = [0.0 for _ in learners]
-    train_examples_per_net = [0 for _ in learners]
-    for learner in learners:
-      learner.optimizer.zero_grad()
+    if train_sampler is not None:
+      train_sampler.set_epoch(epoch)
+    # Accumulate per-net losses in a GPU vector; reading the loss values back
+    # to the host every batch (e.g. via item()) forces a CUDA synchronize and
+    # serializes the Python loop against kernel execution.
+    running_losses = torch.zeros(num_nets, device=cuda_device)
+    train_examples_per_net = torch.zeros(num_nets)
+    learners.ZeroGrad()
+    # Pre-sample the whole epoch's (step, net) batch-use mask in one go
+    # instead of drawing a random number inside the per-net hot loop.
+    num_steps = max(len(train_loader), 1)
+    if accumulation_steps > 1:
+      # With gradient accumulation the use decision is made once per
+      # accumulation window: a net either participates in the whole window
+      # (including the stepping micro-batch whose backward reduces the DDP
+      # gradient buckets) or sits the step out entirely with empty
+      # gradients. A per-micro-batch mask could step a DDP net on locally
+      # accumulated, never-reduced gradients and silently diverge the
+      # replicas.
+      num_windows = (
+          num_steps + accumulation_steps - 1) // accumulation_steps
+      use_mask = torch.bernoulli(
+          torch.full((num_windows, num_nets), batch_use_prob)
+          ).repeat_interleave(accumulation_steps, dim=0)[:num_steps]
+    else:
+      use_mask = torch.bernoulli(
+          torch.full((num_steps, num_nets), batch_use_prob))
+    if torch.distributed.is_available() and torch.distributed.is_initialized():
+      # All ranks must agree on which nets train on which step: a net that
+      # skips a batch on some ranks only would miss that step's gradient
+      # AllReduce and deadlock the collective.
+      use_mask_sync = use_mask.to(cuda_device)
+      torch.distributed.broadcast(use_mask_sync, src=0)
+      use_mask = use_mask_sync.cpu()
 
     epoch_start_time = time.time()
-    for training_batch in train_loader:
-      input_vars, label_vars, weights_var = DataBatchToVariables(
-          training_batch, num_inputs, num_labels, cuda_device_id)
-
-      for net_idx, learner in enumerate(learners):
-        if random.uniform(0.0, 1.0) < batch_use_prob:
-          # forward + backward + optimize
-          outputs = learner.net(input_vars)
-          loss_value = train_settings.loss(outputs, label_vars, weights_var)
-          loss_value.backward()
-          learner.optimizer.step()
-          learner.optimizer.zero_grad()
-
-          # Accumulate statistics
-          batch_size = input_vars[0].size()[0]
-          train_examples_per_net[net_idx] += batch_size
-          running_losses[net_idx] += loss_value.data[0] * batch_size
+    for step_idx, (input_vars, label_vars, weights_var) in enumerate(
+        train_prefetcher):
+      batch_size = input_vars[0].shape[0]
+      batch_losses, used_nets = learners.TrainStep(
+          loss_fn, input_vars, label_vars, weights_var,
+          use_mask[step_idx], autocast_bf16, accumulation_steps,
+          do_step=((step_idx + 1) % accumulation_steps == 0))
+      running_losses += batch_losses * batch_size
+      train_examples_per_net += used_nets * batch_size
+    # Read the accumulated losses back to the host once per epoch.
+    running_losses, train_examples_per_net = ReduceEpochStats(
+        running_losses, train_examples_per_net, cuda_device)
     epoch_end_time = time.time()
 
     epoch_duration = epoch_end_time - epoch_start_time
@@ -121,27 +547,26 @@ def TrainModels(
     avg_losses = AverageLosses(running_losses, train_examples_per_net)
     avg_loss = sum(running_losses) / sum(train_examples_per_net)
 
-    validation_total_losses = [0.0 for _ in learners]
-    validation_examples = [0 for _ in learners]
+    learners.SetEval()
 
-    for learner in learners:
-      learner.net.eval()
+    # inference_mode is stronger than no_grad: validation tensors carry no
+    # autograd or view-tracking metadata at all. Repeated-launch overhead in
+    # the val forward passes is already covered by the CUDA-graph capture
+    # that reduce-overhead compilation does for the shape-stable steps.
+    with torch.inference_mode():
+      validation_total_losses = torch.zeros(num_nets, device=cuda_device)
+      validation_examples = torch.zeros(num_nets)
+      for input_vars, label_vars, weights_var in val_prefetcher:
+        batch_size = input_vars[0].shape[0]
+        batch_losses = learners.EvalLosses(
+            loss_fn, input_vars, label_vars, weights_var, autocast_bf16)
+        validation_total_losses += batch_losses * batch_size
+        validation_examples += batch_size
+      validation_total_losses, validation_examples = ReduceEpochStats(
+          validation_total_losses, validation_examples, cuda_device)
 
-    for val_batch in val_loader:
-      input_vars, label_vars, weights_var = DataBatchToVariables(
-          val_batch, num_inputs, num_labels, cuda_device_id)
+    learners.SetTrain()
 
-      for net_idx, learner in enumerate(learners):
-        outputs = learner.net(input_vars)
-        loss_value = train_settings.loss(outputs, label_vars, weights_var)
-
-        batch_size = input_vars[0].size()[0]
-        validation_examples[net_idx] += batch_size
-        validation_total_losses[net_idx] += loss_value.data[0] * batch_size
-    
-    for learner in learners:
-      learner.net.train()
-    
     validation_avg_losses = AverageLosses(
         validation_total_losses, validation_examples)
     validation_avg_loss = (
@@ -164,31 +589,27 @@ def TrainModels(
       # best loss.
       val_improved_marker = ' *'
 
-    for net_idx, learner in enumerate(learners):
-      if learner.lr_scheduler is not None:
-        learner.lr_scheduler.step(validation_avg_losses[net_idx])
+    learners.SchedulerStep(validation_avg_losses)
+    for net_idx in range(num_nets):
       if validation_avg_losses[net_idx] < min_validation_losses[net_idx]:
-        learner.net.cpu()
-        torch.save(
-            learner.net.state_dict(),
-            io_helpers.ModelFileName(out_dir, net_idx, io_helpers.BEST))
-        learner.net.cuda(cuda_device_id)
+        if is_chief:
+          learners.SaveNet(
+              net_idx,
+              io_helpers.ModelFileName(out_dir, net_idx, io_helpers.BEST))
         min_validation_losses[net_idx] = validation_avg_losses[net_idx]
-    
+
     # Maybe print metrics to screen.
-    if print_log:
+    if print_log and is_chief:
       print('Epoch %d;  %s%s' %
           (epoch, TrainLogEventToString(epoch_metrics), val_improved_marker))
     # Maybe log metrics to tensorboard.
-    if log_dir != '':
+    if logger is not None:
       logger.log_value('train_loss', avg_loss, epoch)
       logger.log_value('val_loss', validation_avg_loss, epoch)
-  
-  for net_idx, learner in enumerate(learners):
-    learner.net.cpu()
-    torch.save(
-        learner.net.state_dict(),
-        io_helpers.ModelFileName(out_dir, net_idx, io_helpers.LAST))
-    learner.net.cuda(cuda_device_id)
-
-  return train_log
\ No newline at end of file
+
+  if is_chief:
+    for net_idx in range(num_nets):
+      learners.SaveNet(
+          net_idx, io_helpers.ModelFileName(out_dir, net_idx, io_helpers.LAST))
+
+  return train_log
@@ -19,6 +19,12 @@ if __name__ == '__main__':
   parser.add_argument('--optimizer', default=training_helpers.SGD)
   parser.add_argument('--learning_rate', type=float, default=1e-3)
   parser.add_argument('--plateau_patience_epochs', type=int, default=0)
+  parser.add_argument('--autocast_bf16', type=int, default=1,
+      help='Run the forward pass and loss in bfloat16 autocast. Pass 0 to '
+          'train in full FP32 (e.g. on pre-Ampere GPUs).')
+  parser.add_argument('--accumulation_steps', type=int, default=1,
+      help='Accumulate gradients over this many batches per optimizer step '
+          'to emulate a larger effective batch size.')
   parser.add_argument('--in_channels', type=int, default=3)
   parser.add_argument('--target_height', type=int, required=True)
   parser.add_argument('--target_width', type=int, required=True)
@@ -56,6 +62,10 @@ if __name__ == '__main__':
   parser.add_argument('--grayscale_interpolate_prob', type=float, default=0.0)
   parser.add_argument(
       '--example_label_extra_weight_scale', type=float, default=0.0)
+  parser.add_argument('--dataset_on_gpu', type=int, default=0,
+      help='Pass 1 to upload the whole (unaugmented) dataset to GPU memory '
+          'once instead of copying batches from the host every epoch. '
+          'Requires the dataset to fit in GPU memory.')
   parser.add_argument('--dry_run', type=bool, default=False)
   parser.add_argument('--settings_id', default='')  
   parser.add_argument('--cuda_device_id', type=int, default=0)
@@ -77,6 +87,8 @@ if __name__ == '__main__':
     training_helpers.OPTIMIZER: args.optimizer,
     training_helpers.LEARNING_RATE: args.learning_rate,
     training_helpers.PLATEAU_PATIENCE_EPOCHS: args.plateau_patience_epochs,
+    training_helpers.AUTOCAST_BF16: bool(args.autocast_bf16),
+    training_helpers.ACCUMULATION_STEPS: args.accumulation_steps,
     training_helpers.MAX_HORIZONTAL_SHIFT_PIXELS: args.max_horizontal_shift_pixels,
     training_helpers.HORIZONTAL_LABEL_SHIFT_RATE: [
         float(x) for x in args.horizontal_label_shift_rate.split(',')],
@@ -114,7 +126,8 @@ if __name__ == '__main__':
       args.num_nets_to_train,
       args.epochs,
       cuda_device_id=args.cuda_device_id,
-      preload_weight_names=preload_names)
+      preload_weight_names=preload_names,
+      dataset_on_gpu=bool(args.dataset_on_gpu))
 
   optimize.TrainModels(
       learners,
@@ -3,8 +3,11 @@ import io_helpers
 import models
 import optimize
 
+import os
+
 import numpy as np
 
+import torch.distributed
 import torch.utils.data
 
 SETTINGS_ID = 'settings_id'
@@ -30,6 +33,8 @@ EXAMPLE_LABEL_EXTRA_WEIGHT_SCALE = 'example_lable_extra_weight_scale'
 DO_PCA_RANDOM_SHIFTS = 'do_pca_random_shifts'
 OPTIMIZER = 'optimizer'
 PLATEAU_PATIENCE_EPOCHS = 'plateau_patience_epochs'
+AUTOCAST_BF16 = 'autocast_bf16'
+ACCUMULATION_STEPS = 'accumulation_steps'
 
 ADAM = 'adam'
 SGD = 'sgd'
@@ -42,7 +47,11 @@ def MakeDataLoader(
     example_label_extra_weight_scale,
     augmenters,
     batch_size,
-    shuffle):
+    shuffle,
+    drop_last=False,
+    num_workers=0,
+    dataset_on_gpu=False,
+    cuda_device_id=0):
   plain_dataset = io_helpers.InMemoryNumpyDataset(data)
   weighted_dataset = io_helpers.L1LabelWeightingDataset(
       plain_dataset, weighting_label_idx, example_label_extra_weight_scale)
@@ -51,8 +60,36 @@ def MakeDataLoader(
       image_element_idx,
       augmenters,
       target_width)
+  distributed = (
+      torch.distributed.is_available() and torch.distributed.is_initialized())
+  if dataset_on_gpu and not augmenters and not distributed:
+    # Without per-item augmentation the dataset is static, so it can live on
+    # the GPU wholesale and skip per-epoch host-to-device copies entirely.
+    return io_helpers.GpuBatchLoader(
+        image_dataset, batch_size, shuffle, cuda_device_id,
+        drop_last=drop_last)
+  sampler = None
+  if shuffle and distributed:
+    # Under DDP every rank sees its own shard of the training data.
+    sampler = torch.utils.data.distributed.DistributedSampler(image_dataset)
+  worker_kwargs = {}
+  if num_workers > 0:
+    worker_kwargs = {
+        'num_workers': num_workers,
+        # Keep the worker processes (and their page caches) alive across
+        # epochs instead of forking a fresh set every epoch.
+        'persistent_workers': True,
+        # Deeper prefetch queues only grow host memory without helping.
+        'prefetch_factor': 2,
+    }
   return torch.utils.data.DataLoader(
-      image_dataset, batch_size=batch_size, shuffle=shuffle)
+      image_dataset,
+      batch_size=batch_size,
+      shuffle=(shuffle and sampler is None),
+      sampler=sampler,
+      pin_memory=True,
+      drop_last=drop_last,
+      **worker_kwargs)
   
 def MakeDataLoaders(
     train_data,
@@ -62,7 +99,10 @@ def MakeDataLoaders(
     target_width,
     augment_settings,
     batch_size,
-    example_label_extra_weight_scale=0.0):
+    example_label_extra_weight_scale=0.0,
+    num_workers=0,
+    dataset_on_gpu=False,
+    cuda_device_id=0):
   augmenters = augmentation.MakeAugmenters(
       augment_settings, image_element_idx, weighting_label_idx, train_data)
   
@@ -74,8 +114,15 @@ def MakeDataLoaders(
       example_label_extra_weight_scale,
       augmenters,
       batch_size,
-      True)
-  
+      True,
+      # Keep the batch shape constant across training steps so compiled nets
+      # are not recompiled (and CUDA graphs not recaptured) for the last
+      # partial batch.
+      drop_last=True,
+      num_workers=num_workers,
+      dataset_on_gpu=dataset_on_gpu,
+      cuda_device_id=cuda_device_id)
+
   val_loader = MakeDataLoader(
       val_data,
       image_element_idx,
@@ -84,19 +131,28 @@ def MakeDataLoaders(
       example_label_extra_weight_scale,
       [],  # augmenters
       batch_size,
-      False)
-  
+      False,
+      num_workers=num_workers,
+      dataset_on_gpu=dataset_on_gpu,
+      cuda_device_id=cuda_device_id)
+
   return train_loader, val_loader
   
-def MakeOptimizer(net, optimizer_name, lr):
+def MakeOptimizer(params, optimizer_name, lr):
   if optimizer_name == ADAM:
-    return torch.optim.Adam(net.parameters(), lr=lr)
+    return torch.optim.Adam(params, lr=lr)
   elif optimizer_name == SGD:
-    return torch.optim.SGD(net.parameters(), lr=lr, momentum=0.9)
+    return torch.optim.SGD(params, lr=lr, momentum=0.9)
   else:
     assert False  # Unknown optimizer name
     return None
 
+def MakeLrScheduler(optimizer, plateau_patience_epochs):
+  if plateau_patience_epochs > 0:
+    return torch.optim.lr_scheduler.ReduceLROnPlateau(
+        optimizer, factor=0.5, patience=plateau_patience_epochs)
+  return None
+
 def MakeTrainer(
     train_data,
     val_data,
@@ -104,8 +160,15 @@ def MakeTrainer(
     num_nets_to_train,
     epochs,
     cuda_device_id=0,
-    preload_weight_names=None):
-  learners = []
+    preload_weight_names=None,
+    loader_num_workers=None,
+    dataset_on_gpu=False):
+  if loader_num_workers is None:
+    loader_num_workers = min(8, os.cpu_count() or 1)
+  distributed = (
+      torch.distributed.is_available() and torch.distributed.is_initialized())
+
+  nets = []
   for net_idx in range(num_nets_to_train):
     net = models.MakeNetwork(
         all_settings[NET_NAME],
@@ -125,18 +188,52 @@ def MakeTrainer(
       net.load_state_dict(torch.load(preload_weight_names[net_idx]))
 
     net.cuda(cuda_device_id)
-    
-    optimizer = MakeOptimizer(
-        net, all_settings[OPTIMIZER], all_settings[LEARNING_RATE])
-    lr_scheduler = None
-    if all_settings[PLATEAU_PATIENCE_EPOCHS] > 0:
-      lr_scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(
-          optimizer, factor=0.5, patience=all_settings[PLATEAU_PATIENCE_EPOCHS])
-    learners.append(optimize.Learner(net, optimizer, lr_scheduler))
+    nets.append(net)
+
+  if (num_nets_to_train > 1 and hasattr(torch, 'func') and not distributed
+      and not optimize.HasBatchNorm(nets[0])):
+    # Identically structured nets train as one vmapped batched model, so a
+    # batch costs one set of kernel launches instead of one per net. DDP
+    # wraps individual modules and so keeps the per-net loop, as do nets
+    # with BatchNorm: vmap cannot update the running statistics in place,
+    # and stripping them would break checkpoint loading.
+    learners = optimize.FusedLearners(
+        nets,
+        lambda params: MakeOptimizer(
+            params, all_settings[OPTIMIZER], all_settings[LEARNING_RATE]),
+        lambda optimizer: MakeLrScheduler(
+            optimizer, all_settings[PLATEAU_PATIENCE_EPOCHS]),
+        cuda_device_id)
+  else:
+    learner_list = []
+    for net in nets:
+      if hasattr(torch, 'compile'):
+        # reduce-overhead mode captures the shape-stable step as a CUDA
+        # graph; under DDP plain compilation is used since CUDA-graph
+        # capture does not mix with bucketed gradient AllReduce.
+        if distributed:
+          net = torch.compile(net)
+        else:
+          net = torch.compile(net, mode='reduce-overhead')
+      if distributed:
+        # Gradient AllReduce is bucketed so communication overlaps backward.
+        net = torch.nn.parallel.DistributedDataParallel(
+            net, device_ids=[cuda_device_id], bucket_cap_mb=25)
+      optimizer = MakeOptimizer(
+          net.parameters(), all_settings[OPTIMIZER],
+          all_settings[LEARNING_RATE])
+      lr_scheduler = MakeLrScheduler(
+          optimizer, all_settings[PLATEAU_PATIENCE_EPOCHS])
+      learner_list.append(optimize.Learner(net, optimizer, lr_scheduler))
+    learners = optimize.LearnerList(learner_list, cuda_device_id)
 
   train_settings = optimize.TrainSettings(
       optimize.SingleLabelLoss(optimize.WeightedMSELoss()),
-      epochs)
+      epochs,
+      # .get() for backwards compatibility with settings JSONs that predate
+      # these options.
+      autocast_bf16=all_settings.get(AUTOCAST_BF16, True),
+      accumulation_steps=all_settings.get(ACCUMULATION_STEPS, 1))
   
   data_element_names = all_settings[INPUT_NAMES] + all_settings[LABEL_NAMES]
   image_element_idx = data_element_names.index(models.FRAME_IMG)
@@ -167,6 +264,9 @@ def MakeTrainer(
       all_settings[TARGET_WIDTH],
       augment_settings,
       all_settings[BATCH_SIZE],
-      all_settings[EXAMPLE_LABEL_EXTRA_WEIGHT_SCALE])
+      all_settings[EXAMPLE_LABEL_EXTRA_WEIGHT_SCALE],
+      num_workers=loader_num_workers,
+      dataset_on_gpu=dataset_on_gpu,
+      cuda_device_id=cuda_device_id)
   
   return learners, train_loader, val_loader, train_settings
\ No newline at end of file